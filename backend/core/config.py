@@ -50,24 +50,43 @@ class Settings(BaseSettings):
     # License Plate Detection Settings
     PLATE_DETECTION_CONFIDENCE: float = 0.6
     OCR_CONFIDENCE_THRESHOLD: float = 0.45
+    OCR_BATCH_SIZE: int = 16
+    PREPROCESS_FRAMES: bool = True  # False trusts the detector on raw frames only
+    RAW_DETECTION_CONFIDENCE: float = 0.85  # below this, retry plates on the enhanced frame
     MAX_PLATE_LENGTH: int = 10
     MIN_PLATE_LENGTH: int = 4
     HISTORY_SIZE_THRESHOLD: int = 50
+    PLATE_CACHE_SIZE: int = 256
+    PLATE_CACHE_TTL: float = 60.0  # seconds
     
     # Camera Settings
     DEFAULT_FPS: int = 25
     FRAME_BUFFER_SIZE: int = 100
     RTSP_TIMEOUT: int = 30
     FRAME_SKIP: int = 2
+    FRAME_RING_SLOTS: int = 16  # per camera, covers two batches in flight
+    FFMPEG_BINARY: str = "ffmpeg"
+    FFMPEG_HWACCEL: Optional[str] = "auto"  # "cuda" forces NVDEC, None decodes on the CPU
+    CAPTURE_TIMEOUT_MS: int = 5000  # OpenCV fallback open/read timeout
+    STREAM_JPEG_QUALITY: int = 70
+    STREAM_MAX_WIDTH: Optional[int] = 1280  # streamed frames are downscaled to this width, None keeps full size
+    GPU_JPEG_MIN_PIXELS: int = 1920 * 1080  # smaller frames encode faster on the CPU
     
     # Security & Privacy Settings
     PLATE_HASH_SALT: str = "your-plate-hash-salt-change-in-production"
     ENABLE_PLATE_HASHING: bool = True
     STORE_PLATE_THUMBNAILS: bool = True
+    THUMBNAIL_JPEG_QUALITY: int = 80
     
     # Performance Settings
     MAX_CONCURRENT_PROCESSING: int = 4
     PROCESSING_TIMEOUT: int = 30
+    INFERENCE_BATCH_SIZE: int = 8  # frames per YOLO call, keep <= 16
+    BATCH_WAIT_MS: float = 5.0  # how long a worker waits to fill a batch, 0 takes only what is queued
+    QUEUE_PRESSURE_THRESHOLD: int = 16  # queued frames per worker before the oldest is dropped
+    HALF_PRECISION: bool = True  # fp16 inference on CUDA
+    OCR_USE_TENSORRT: bool = False  # paddle only applies fp16 through TensorRT
+    PIN_WORKERS: bool = True  # split the allowed cores between worker processes
     
     # Logging Settings
     LOG_LEVEL: str = "INFO"
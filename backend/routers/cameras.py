@@ -358,7 +358,12 @@ async def start_camera(
             return {"message": "Camera already running"}
         
         # TODO: add roi extraction
-        await camera_manager.start_camera(camera_id, camera.stream_url)
+        await camera_manager.start_camera(
+            camera_id,
+            camera.stream_url,
+            camera.resolution_width,
+            camera.resolution_height,
+        )
 
         # Update camera status
         camera.status = CameraStatus.ACTIVE
@@ -11,6 +11,7 @@ import logging
 from backend.database import get_async_db
 from backend.models import LicensePlate, LicensePlateDetection, PlateStatus
 from backend.core.security import verify_token, hash_license_plate, verify_license_plate_hash
+from backend.services.result_processor import result_processor
 from backend.schemas.plate import (
     PlateCreate, PlateUpdate, PlateResponse, PlateDetectionResponse,
     PlateSearchRequest, PlateStatsResponse
@@ -69,6 +70,7 @@ async def create_plate(
         db.add(new_plate)
         await db.commit()
         await db.refresh(new_plate)
+        result_processor.invalidate_plates()
         
         logger.info(f"Created license plate: {plate_data.plate_text} by user {current_user.get('username')}")
         
@@ -217,6 +219,7 @@ async def update_plate(
         
         await db.commit()
         await db.refresh(plate)
+        result_processor.invalidate_plates()
         
         logger.info(f"Updated license plate {plate_id} by user {current_user.get('username')}")
         
@@ -262,6 +265,7 @@ async def delete_plate(
         
         await db.delete(plate)
         await db.commit()
+        result_processor.invalidate_plates()
         
         logger.info(f"Deleted license plate {plate_id} by user {current_user.get('username')}")
         
@@ -2,7 +2,6 @@ from pydantic import BaseModel, Field
 from typing import Optional
 from datetime import datetime
 from enum import Enum
-from backend.schemas.auth import UserResponse
 
 # Enums
 class PlateStatus(str, Enum):
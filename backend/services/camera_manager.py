@@ -1,9 +1,14 @@
 import asyncio
 import cv2
-import time
+import fcntl
+import os
+import shutil
+import subprocess
 from backend.services.worker_pool import worker_pool
+from backend.services.frame_ring import FrameRing
 from backend.core.config import settings
 import logging
+from collections import defaultdict
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
@@ -13,69 +18,256 @@ class CameraManager:
     def __init__(self):
         self.camera_pool = {}
         self.tasks = []
+        self.skipped = defaultdict(int)
 
-    async def start_camera(self, camera_id: int, stream_url: str):
+    async def start_camera(self, camera_id: int, stream_url: str, width: int, height: int):
         """
-        user must ensure not calling this twice
+        Start capturing a camera. A capture still running for the same id
+        (e.g. a quick stop/start) is stopped and awaited first, so a camera
+        never has two decoders and rings at once.
         """
-        self.camera_pool[camera_id] = {
-            'active': True,
+        previous = self.camera_pool.get(camera_id)
+        if previous is not None:
+            previous['stop_event'].set()
+            await asyncio.gather(previous['task'], return_exceptions=True)
+            self.tasks.remove(previous['task'])
+
+        camera = self.camera_pool[camera_id] = {
+            'stop_event': asyncio.Event(),
             'stream_url': stream_url,
+            'shape': (height, width, 3),
         }
 
-        task = asyncio.create_task(self.capture_frames(camera_id))
-        self.tasks.append(task)
-    
+        camera['task'] = asyncio.create_task(self.capture_frames(camera_id))
+        self.tasks.append(camera['task'])
+
     def stop_camera(self, camera_id):
-        self.camera_pool[camera_id]['active'] = False
+        self.camera_pool[camera_id]['stop_event'].set()
 
     def is_camera_active(self, camera_id):
         if not self.camera_pool.get(camera_id):
             return False
-        return self.camera_pool[camera_id]['active']
+        return not self.camera_pool[camera_id]['stop_event'].is_set()
 
     async def shutdown(self):
         for cam in self.camera_pool.values():
-            cam['active'] = False
+            cam['stop_event'].set()
 
         # Wait for all capture tasks to finish
         if self.tasks:
             await asyncio.gather(*self.tasks, return_exceptions=True)
-        
+
         self.tasks.clear()
         logger.info("All camera capture tasks stopped")
 
-    async def capture_frames(self, camera_id: int):
-        stream_url = self.camera_pool[camera_id]['stream_url']
+    def _spawn_decoder(self, stream_url: str, width: int, height: int):
+        """
+        Start an ffmpeg process decoding the stream to raw BGR frames of a
+        fixed size. Returns the process and the non-blocking read end of its
+        stdout pipe.
+        """
+        read_fd, write_fd = os.pipe()
+        try:
+            # fewer wakeups per frame with a bigger pipe (linux only)
+            fcntl.fcntl(read_fd, fcntl.F_SETPIPE_SZ, 1 << 20)
+        except (AttributeError, OSError):
+            pass
 
-        cap = cv2.VideoCapture(stream_url)
-        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
-        
-        frame_count = 0
-        
-        while self.camera_pool.get(camera_id, {}).get('active', False):
-            ret, frame = cap.read()
-            if not ret:
-                await asyncio.sleep(0.1)
-                continue
-            
-            frame_count += 1
-            if frame_count % settings.FRAME_SKIP != 0:
+        args = [settings.FFMPEG_BINARY, '-loglevel', 'error', '-nostdin']
+        if settings.FFMPEG_HWACCEL:
+            # decode on the GPU ("auto" picks NVDEC/VAAPI/... when present and
+            # falls back to software), frames are downloaded once before
+            # scaling so the ring still receives host BGR
+            args += ['-hwaccel', settings.FFMPEG_HWACCEL]
+        if stream_url.startswith('rtsp'):
+            args += ['-rtsp_transport', 'tcp']
+        filters = f'scale={width}:{height}'
+        if settings.FRAME_SKIP > 1:
+            # drop skipped frames inside ffmpeg, they never reach the pipe
+            filters = f"select='not(mod(n+1\\,{settings.FRAME_SKIP}))',{filters}"
+
+        args += [
+            '-i', stream_url,
+            '-vf', filters,
+            '-fps_mode', 'passthrough',
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24', 'pipe:1',
+        ]
+
+        try:
+            proc = subprocess.Popen(args, stdout=write_fd, stderr=subprocess.DEVNULL)
+        finally:
+            os.close(write_fd)
+
+        os.set_blocking(read_fd, False)
+        return proc, read_fd
+
+    async def _wait_readable(self, fd: int, stop: asyncio.Event) -> bool:
+        """
+        Wait for the pipe to become readable, or for the camera to be
+        stopped: a stalled source must not keep stop_camera from working.
+        Returns False when stopped.
+        """
+        loop = asyncio.get_running_loop()
+        ready = loop.create_future()
+        stopped = asyncio.ensure_future(stop.wait())
+        loop.add_reader(fd, lambda: ready.done() or ready.set_result(None))
+        try:
+            await asyncio.wait((ready, stopped), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            loop.remove_reader(fd)
+            stopped.cancel()
+        return not stop.is_set()
+
+    async def _read_frame(self, fd: int, buf: memoryview, stop: asyncio.Event) -> bool:
+        """Fill buf straight from the decoder pipe, False on end of stream or stop"""
+        filled = 0
+        size = len(buf)
+        while filled < size:
+            try:
+                n = os.readv(fd, [buf[filled:]])
+            except BlockingIOError:
+                if not await self._wait_readable(fd, stop):
+                    return False
                 continue
-            
-            submitted = worker_pool.submit_frame(
-                camera_id=camera_id,
-                frame=frame,
-                timestamp=datetime.now(),
-            )
-            
-            if not submitted:
-                logger.warning(f"Camera {camera_id}: worker queue full, skipping frame")
-            
-            await asyncio.sleep(0.100)  # Yield control
-        
-        cap.release()
+            if n == 0:
+                return False
+            filled += n
+        return True
+
+    async def capture_frames(self, camera_id: int):
+        camera = self.camera_pool[camera_id]
+        try:
+            ring = FrameRing(camera['shape'], settings.FRAME_RING_SLOTS)
+        except MemoryError as e:
+            logger.error(f"Camera {camera_id}: {e}")
+            return
+
+        try:
+            if shutil.which(settings.FFMPEG_BINARY):
+                await self._capture_ffmpeg(camera_id, ring)
+            else:
+                logger.warning(f"Camera {camera_id}: {settings.FFMPEG_BINARY} not found, "
+                               f"falling back to OpenCV decoding")
+                await self._capture_opencv(camera_id, ring)
+        finally:
+            ring.close()
+
         logger.info(f"Camera {camera_id} capture stopped")
 
+    def _submit(self, camera_id: int, ring: FrameRing, slot: int):
+        ring.commit(slot)
+        submitted = worker_pool.submit_frame(
+            camera_id=camera_id,
+            ring=ring,
+            slot=slot,
+            timestamp=datetime.now(),
+        )
+
+        if not submitted:
+            ring.release(slot)
+            self._skip(camera_id, "worker queue full")
+
+    def _skip(self, camera_id: int, reason: str):
+        """Count a skipped frame, logging only every 100th so a stuck camera doesn't flood the log"""
+        self.skipped[camera_id] += 1
+        if self.skipped[camera_id] % 100 == 1:
+            logger.warning(f"Camera {camera_id}: {reason}, skipped {self.skipped[camera_id]} frames so far")
+
+    async def _capture_ffmpeg(self, camera_id: int, ring: FrameRing):
+        camera = self.camera_pool[camera_id]
+        stream_url = camera['stream_url']
+        height, width, _ = camera['shape']
+        stop = camera['stop_event']
+        proc, fd = None, None
+
+        # frames still have to be drained from the pipe when no slot is free
+        discard = memoryview(bytearray(ring.frame_bytes))
+        slot = None
+
+        try:
+            proc, fd = self._spawn_decoder(stream_url, width, height)
+
+            while not stop.is_set():
+                if slot is None:
+                    # the oldest queued frame goes first when the worker is behind
+                    slot = worker_pool.acquire_slot(camera_id, ring)
+
+                if not await self._read_frame(fd, discard if slot is None else ring.buffer(slot), stop):
+                    if stop.is_set():
+                        break
+                    logger.warning(f"Camera {camera_id}: stream ended, restarting decoder")
+                    self._stop_decoder(proc, fd)
+                    proc, fd = None, None
+                    try:
+                        await asyncio.wait_for(stop.wait(), timeout=1)
+                        break
+                    except asyncio.TimeoutError:
+                        pass
+                    proc, fd = self._spawn_decoder(stream_url, width, height)
+                    continue
+
+                if slot is None:
+                    self._skip(camera_id, "all frame slots in use")
+                    continue
+
+                self._submit(camera_id, ring, slot)
+                slot = None
+        finally:
+            if proc is not None:
+                self._stop_decoder(proc, fd)
+
+    async def _capture_opencv(self, camera_id: int, ring: FrameRing):
+        """
+        Software decoding through cv2.VideoCapture, used when ffmpeg is not
+        installed. Blocking reads run in a thread so the event loop stays free.
+        """
+        camera = self.camera_pool[camera_id]
+        height, width, _ = camera['shape']
+        stop = camera['stop_event']
+
+        # bounded open/read timeouts, a stalled source would otherwise block
+        # the reading thread (and with it stop_camera) forever
+        cap = cv2.VideoCapture(camera['stream_url'], cv2.CAP_ANY, [
+            cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, settings.CAPTURE_TIMEOUT_MS,
+            cv2.CAP_PROP_READ_TIMEOUT_MSEC, settings.CAPTURE_TIMEOUT_MS,
+        ])
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+
+        def read(decode: bool):
+            # grab() skips decoding of frames we would drop anyway
+            for _ in range(settings.FRAME_SKIP - 1):
+                cap.grab()
+            if not decode:
+                return cap.grab(), None
+            return cap.read()
+
+        slot = None
+        try:
+            while not stop.is_set():
+                if slot is None:
+                    # the oldest queued frame goes first when the worker is behind
+                    slot = worker_pool.acquire_slot(camera_id, ring)
+
+                # without a slot the frame can't be queued, so it is only grabbed
+                ret, frame = await asyncio.to_thread(read, slot is not None)
+                if not ret:
+                    await asyncio.sleep(0.1)
+                    continue
+
+                if slot is None:
+                    self._skip(camera_id, "all frame slots in use")
+                    continue
+
+                cv2.resize(frame, (width, height), dst=ring.frames[slot])
+                self._submit(camera_id, ring, slot)
+                slot = None
+        finally:
+            cap.release()
+
+    def _stop_decoder(self, proc, fd: int):
+        proc.kill()
+        proc.wait()
+        os.close(fd)
+
 
 camera_manager = CameraManager()
@@ -0,0 +1,130 @@
+# Shared-memory ring of decoded frames
+# Lets the capture loop hand frames to worker processes without pickling them
+
+import os
+import numpy as np
+from multiprocessing import shared_memory
+from typing import Optional, Tuple
+
+# keep the state array and the frame area on their own cache lines
+_HEADER_ALIGN = 64
+
+# slot states, a slot is written by the producer only while FREE
+SLOT_FREE = 0
+SLOT_IN_USE = 1
+
+RingSpec = Tuple[str, Tuple[int, int, int], int]
+
+
+class FrameRing:
+    """
+    Fixed number of BGR frame slots backed by one SharedMemory segment.
+
+    The producer only writes FREE slots and marks them IN_USE; the consumer
+    hands a slot back with release() once it is done with the pixels, so a
+    frame is never overwritten while a worker still reads it. Every written
+    slot is also stamped with a sequence number, letting a consumer detect
+    a reference that outlived its ring.
+    """
+
+    def __init__(self, shape: Tuple[int, int, int], slots: int, name: str = None):
+        self.shape = tuple(shape)
+        self.slots = slots
+        self.owner = name is None
+
+        self.frame_bytes = int(np.prod(self.shape))
+        array_bytes = -(-slots * 8 // _HEADER_ALIGN) * _HEADER_ALIGN
+        header_bytes = 2 * array_bytes
+
+        self.shm = shared_memory.SharedMemory(
+            name=name,
+            create=self.owner,
+            size=header_bytes + slots * self.frame_bytes if self.owner else 0,
+        )
+        self.seq = np.ndarray((slots,), dtype=np.int64, buffer=self.shm.buf)
+        self.state = np.ndarray((slots,), dtype=np.int64, buffer=self.shm.buf, offset=array_bytes)
+        self.frames = np.ndarray((slots, *self.shape), dtype=np.uint8,
+                                 buffer=self.shm.buf, offset=header_bytes)
+
+        if self.owner:
+            self._reserve(header_bytes + slots * self.frame_bytes)
+            self.seq[:] = -1
+            self.state[:] = SLOT_FREE
+        self._next = 0
+        self._count = 0
+
+    def _reserve(self, size: int):
+        """
+        Allocate the whole segment up front. tmpfs only backs pages as they
+        are touched, so a full /dev/shm would otherwise surface later as
+        EFAULT from readv or SIGBUS when writing a frame.
+        """
+        if not hasattr(os, "posix_fallocate"):
+            return
+        try:
+            os.posix_fallocate(self.shm._fd, 0, size)
+        except OSError as e:
+            self.close()
+            raise MemoryError(
+                f"Cannot allocate {size / 2**20:.0f} MiB of shared memory for a "
+                f"{self.slots}-slot {self.shape[1]}x{self.shape[0]} frame ring ({e.strerror}); "
+                f"enlarge /dev/shm (shm_size in docker-compose) or lower FRAME_RING_SLOTS"
+            ) from e
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def spec(self) -> RingSpec:
+        """Picklable description used by other processes to attach"""
+        return (self.name, self.shape, self.slots)
+
+    @classmethod
+    def attach(cls, spec: RingSpec) -> "FrameRing":
+        name, shape, slots = spec
+        return cls(shape, slots, name=name)
+
+    def acquire(self) -> Optional[int]:
+        """
+        Return the next free slot to write into (producer side), or None
+        when every slot is still held by a consumer.
+        """
+        for offset in range(self.slots):
+            slot = (self._next + offset) % self.slots
+            if self.state[slot] == SLOT_FREE:
+                self._next = (slot + 1) % self.slots
+                # invalidate first so readers never trust a half written frame
+                self.seq[slot] = -1
+                self.state[slot] = SLOT_IN_USE
+                return slot
+        return None
+
+    def release(self, slot: int):
+        """Hand a slot back to the producer once its frame is no longer needed"""
+        if self.state is not None:  # closed rings have nothing to give back
+            self.state[slot] = SLOT_FREE
+
+    def buffer(self, slot: int) -> memoryview:
+        """Flat writable view over a slot, suitable for os.readv"""
+        return self.frames[slot].reshape(-1).data
+
+    def commit(self, slot: int) -> int:
+        """Mark a slot as holding a new frame and return its sequence number"""
+        self._count += 1
+        self.seq[slot] = self._count
+        return self._count
+
+    def is_current(self, slot: int, seq: int) -> bool:
+        return self.seq[slot] == seq
+
+    def close(self):
+        # numpy views must go before the mapping can be closed
+        self.seq = None
+        self.state = None
+        self.frames = None
+        self.shm.close()
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
@@ -3,22 +3,57 @@
 
 import cv2
 import numpy as np
-import torch
-from ultralytics import YOLO, utils
-from paddleocr import TextRecognition
-from typing import List, Tuple, Optional, Dict, Any
+from numba import njit
+from typing import List, Tuple, Dict, Any
 import logging
 from datetime import datetime
 import os
 import re
-import openvino
+from concurrent.futures import ThreadPoolExecutor
 
 from backend.core.config import settings
 
 logger = logging.getLogger(__name__)
-utils.LOGGER.setLevel("ERROR")
 logger.setLevel(logging.INFO)
 
+_PLATE_RE = re.compile(r'^\d{10,11}$')
+
+# Common character corrections for Algerian plates
+_PLATE_CORRECTIONS = str.maketrans({
+    'O': '0',  # Letter O to number 0
+    'I': '1',  # Letter I to number 1
+    'S': '5',  # Letter S to number 5
+    'B': '8',  # Letter B to number 8
+    'G': '6',
+    '|': '1',
+    ']': '1',
+    'J': '3',
+    'A': '4'
+})
+
+_SHARPEN_KERNEL = np.array([[0, -1, 0],
+                            [-1, 5, -1],
+                            [0, -1, 0]], dtype=np.float32)
+
+_CLOSE_KERNEL = cv2.getStructuringElement(cv2.MORPH_RECT, (2, 2))
+
+
+@njit(cache=True, nogil=True, fastmath=True)
+def _owning_vehicles(xyxy, tracked_vehicles):
+    """
+    Index of the first tracked vehicle strictly containing each plate, -1
+    when none does. A plain double loop: with a handful of plates and
+    vehicles per frame it beats the temporaries of a NumPy broadcast.
+    """
+    owner = np.full(xyxy.shape[0], -1, np.int64)
+    for p in range(xyxy.shape[0]):
+        for v in range(tracked_vehicles.shape[0]):
+            if (xyxy[p, 0] > tracked_vehicles[v, 0] and xyxy[p, 1] > tracked_vehicles[v, 1] and
+                    xyxy[p, 2] < tracked_vehicles[v, 2] and xyxy[p, 3] < tracked_vehicles[v, 3]):
+                owner[p] = v
+                break
+    return owner
+
 
 class LicensePlateProcessor:
     """
@@ -31,18 +66,37 @@ class LicensePlateProcessor:
         self.detection_model = None
         self.vehicle_detection_model = None
         self.ocr_reader = None
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        
-        # Load models
-        self._load_models()
+        self.device = "cpu"  # resolved in _load_models
+
+        # scratch arrays reused across frames, see _buffer
+        self._buffers: Dict[Tuple, np.ndarray] = {}
+
+        # thumbnails are written off the detection path
+        self._thumb_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="thumbnail")
         
-        # Processing parameters
+        # Processing parameters (needed by the warmup in _load_models)
         self.detection_confidence = settings.PLATE_DETECTION_CONFIDENCE
         self.ocr_confidence_threshold = settings.OCR_CONFIDENCE_THRESHOLD
+        self.use_preprocess = settings.PREPROCESS_FRAMES
+        
+        # Load models
+        self._load_models()
+
+        # compile the association kernel (or load it from cache) before the first frame
+        _owning_vehicles(np.zeros((1, 4), np.int32), np.zeros((1, 5)))
     
     def _load_models(self):
         """Load YOLO detection model and OCR reader."""
         try:
+            # heavy frameworks are only imported by processes that run models
+            import torch
+            import openvino
+            from ultralytics import YOLO, utils
+            from paddleocr import TextRecognition
+
+            utils.LOGGER.setLevel("ERROR")
+            self.device = "cuda" if torch.cuda.is_available() else "cpu"
+
             model_path = os.path.join(settings.MODELS_DIR, "yolo_plate_detection.pt")
             use_openvino = False
 
@@ -50,70 +104,110 @@ class LicensePlateProcessor:
                 raise Exception("Custom plate detection model not found")
 
             try:
-                if not self.device == "cpu":
-                    raise
-
-                core = openvino.Core()
-                if not "GPU" in core.available_devices:
-                    raise
-
-                openvino_path = "yolov8n_openvino_model"
-                if not os.path.exists(openvino_path):
-                    logger.info("Exporting YOLO model to OpenVINO format...")
-                    YOLO("yolov8n.pt").export(format="openvino")
-                    logger.info("OpenVINO export completed")
-
-                self.vehicle_detection_model = YOLO(openvino_path)
-
-                openvino_path = os.path.join(settings.MODELS_DIR, "yolo_plate_detection_openvino_model")
-                if not os.path.exists(openvino_path):
-                    logger.info("Exporting YOLO LP model to OpenVINO format...")
-                    YOLO(model_path).export(format="openvino")
-                    logger.info("OpenVINO export completed")
-
-                self.detection_model = YOLO(openvino_path)
-
-                use_openvino = True
-                logger.info("Using openvino for detection")
-            except:
-                pass
+                if self.device == "cpu" and "GPU" in openvino.Core().available_devices:
+                    # the workers pass whole batches, so export with a dynamic batch
+                    # dimension; older static exports live under the old names and are ignored
+                    openvino_path = "yolov8n_dynamic_openvino_model"
+                    if not os.path.exists(openvino_path):
+                        logger.info("Exporting YOLO model to OpenVINO format...")
+                        self._export_openvino("yolov8n.pt", openvino_path)
+                        logger.info("OpenVINO export completed")
+
+                    self.vehicle_detection_model = YOLO(openvino_path)
+
+                    openvino_path = os.path.join(settings.MODELS_DIR, "yolo_plate_detection_dynamic_openvino_model")
+                    if not os.path.exists(openvino_path):
+                        logger.info("Exporting YOLO LP model to OpenVINO format...")
+                        self._export_openvino(model_path, openvino_path)
+                        logger.info("OpenVINO export completed")
+
+                    self.detection_model = YOLO(openvino_path)
+
+                    use_openvino = True
+                    logger.info("Using openvino for detection")
+            except Exception as e:
+                logger.warning(f"OpenVINO setup failed, falling back to PyTorch: {e}")
 
             if not use_openvino:
                 self.vehicle_detection_model = YOLO("yolov8n.pt").to(self.device)
                 self.detection_model = YOLO(model_path).to(self.device)
 
+                if self.device == "cuda" and settings.HALF_PRECISION:
+                    # ultralytics casts the weights and inputs to fp16 at predict time
+                    self.vehicle_detection_model.overrides['half'] = True
+                    self.detection_model.overrides['half'] = True
+
+            ocr_options = {}
+            if self.device == "cuda":
+                ocr_options['use_tensorrt'] = settings.OCR_USE_TENSORRT
+                ocr_options['precision'] = 'fp16' if settings.HALF_PRECISION else 'fp32'
+            elif settings.PIN_WORKERS and hasattr(os, "sched_getaffinity"):
+                # size paddle's CPU pool to the cores this worker was pinned to
+                ocr_options['cpu_threads'] = len(os.sched_getaffinity(0))
+
             self.ocr_reader = TextRecognition(
                 model_name="PP-OCRv5_mobile_rec",
-                device='gpu' if torch.cuda.is_available() else 'cpu',
+                device='gpu' if self.device == "cuda" else 'cpu',
+                **ocr_options,
             )
 
+            if self.device == "cuda":
+                self._warmup()
+
             logger.info("Models loaded successfully")
 
         except Exception as e:
             logger.error(f"Error loading models: {e}")
             raise
     
-    def preprocess_image(self, image: np.ndarray) -> np.ndarray:
+    def _export_openvino(self, weights: str, path: str):
+        """Export `weights` to OpenVINO at `path`, accepting up to INFERENCE_BATCH_SIZE frames per call"""
+        from ultralytics import YOLO
+
+        exported = YOLO(weights).export(format="openvino", dynamic=True, batch=settings.INFERENCE_BATCH_SIZE)
+        os.replace(exported, path)
+
+    def _buffer(self, name: str, like: np.ndarray) -> np.ndarray:
+        """
+        Return a scratch array with the shape and dtype of `like`.
+        The same array is handed out for the same name and shape, so the
+        result is only valid until the next call using that name.
+        """
+        key = (name, like.shape, like.dtype.str)
+        buf = self._buffers.get(key)
+        if buf is None:
+            buf = self._buffers[key] = np.empty_like(like)
+        return buf
+
+    def _warmup(self):
+        """Push dummy frames through the detectors so CUDA context setup and cuDNN autotuning happen before real traffic"""
+        dummy = np.zeros((640, 640, 3), dtype=np.uint8)
+        for _ in range(2):
+            self.vehicle_detection_model(dummy, conf=self.detection_confidence, verbose=False)
+            self.detection_model(dummy, conf=self.detection_confidence, verbose=False)
+
+    def preprocess_image(self, image: np.ndarray, buffer_id: int = 0) -> np.ndarray:
         """
         Preprocess image for better plate detection and OCR.
         
         Args:
             image: Input image as numpy array
+            buffer_id: Scratch buffer set to use, distinct ids keep several results alive
             
         Returns:
-            np.ndarray: Preprocessed image
+            np.ndarray: Preprocessed image, overwritten by the next call with the same buffer_id
         """
         try:
             # Simple contrast + brightness normalization
-            enhanced = cv2.convertScaleAbs(image, alpha=1.3, beta=10)
+            enhanced = cv2.convertScaleAbs(image, alpha=1.3, beta=10,
+                                           dst=self._buffer(f'enhanced{buffer_id}', image))
 
             # Light sharpening (cheap)
-            kernel = np.array([[0, -1, 0],
-                               [-1, 5, -1],
-                               [0, -1, 0]])
-            sharpened = cv2.filter2D(enhanced, -1, kernel)
+            sharpened = cv2.filter2D(enhanced, -1, _SHARPEN_KERNEL,
+                                     dst=self._buffer(f'sharpened{buffer_id}', image))
 
-            final = cv2.GaussianBlur(sharpened, (3, 3), 0)
+            # the contrast buffer is free again, blur back into it
+            final = cv2.GaussianBlur(sharpened, (3, 3), 0, dst=enhanced)
 
             return final
 
@@ -128,54 +222,106 @@ class LicensePlateProcessor:
         
         Args:
             image: Input image as numpy array
+            tracker: SORT tracker of the camera the image comes from
             
         Returns:
             List[Dict]: List of detected plates with bounding boxes and confidence
         """
-        try:
-            processed_image = self.preprocess_image(image)
-
-            vehicles = []
-            detections = self.vehicle_detection_model(processed_image, conf=self.detection_confidence)[0]
-
-            for box in detections.boxes:
-                x1, y1, x2, y2 = map(int, box.xyxy[0].cpu().numpy())
-                confidence = box.conf[0].cpu().numpy()
-                class_id = int(box.cls[0].cpu().numpy())
-
-                if int(class_id) in [2, 5, 7]:
-                    vehicles.append([x1, y1, x2, y2, confidence])
-
-            if len(vehicles) == 0:
-                return []
-
-            tracked_vehicles = tracker.update(np.asarray(vehicles))
-
-            license_plates = []
-            detections = self.detection_model(processed_image, conf=self.detection_confidence)[0]
+        return self.detect_license_plates_batch([image], [tracker])[0]
 
-            for box in detections.boxes:
-                x1, y1, x2, y2 = map(int, box.xyxy[0].cpu().numpy())
-                confidence = box.conf[0].cpu().numpy()
-
-                for vehicle in tracked_vehicles:
-                    car_x1, car_y1, car_x2, car_y2, id = vehicle
-
-                    if x1 > car_x1 and y1 > car_y1 and x2 < car_x2 and y2 < car_y2:
-                        license_plates.append({
-                            'id': int(id),
-                            'bbox': tuple(map(int, (x1, y1, x2, y2))),
-                            'vbbox': tuple(map(int, (car_x1, car_y1, car_x2, car_y2))),
-                            'confidence': float(confidence),
-                            })
-                        break
+    def detect_license_plates_batch(self, images: List[np.ndarray], trackers: List) -> List[List[Dict[str, Any]]]:
+        """
+        Detect license plates in several frames with one YOLO call per model.
+        
+        Args:
+            images: Frames to process, possibly from different cameras
+            trackers: SORT tracker of each frame's camera, in the same order
             
+        Returns:
+            List[List[Dict]]: Detected plates of every frame, as in detect_license_plates
+        """
+        try:
+            license_plates = [[] for _ in images]
+
+            # frame index -> tracked vehicles, frames without vehicles stop here
+            tracked = {}
+            vehicle_results = self.vehicle_detection_model(images, conf=self.detection_confidence)
+            for i, (detections, tracker) in enumerate(zip(vehicle_results, trackers)):
+                xyxy, conf, class_ids = self._boxes_to_numpy(detections.boxes)
+
+                is_vehicle = np.isin(class_ids, (2, 5, 7))
+                if is_vehicle.any():
+                    vehicles = np.concatenate([xyxy[is_vehicle], conf[is_vehicle, None]], axis=1)
+                    tracked[i] = tracker.update(vehicles)
+
+            if not tracked:
+                return license_plates
+
+            indices = list(tracked)
+            plate_results = self.detection_model([images[i] for i in indices], conf=self.detection_confidence)
+            plates = [self._boxes_to_numpy(detections.boxes)[:2] for detections in plate_results]
+
+            # only pay for enhancement where the raw frame is not good enough
+            weak = [n for n, (_, conf) in enumerate(plates)
+                    if len(conf) == 0 or conf.max() < settings.RAW_DETECTION_CONFIDENCE]
+            if weak and self.use_preprocess:
+                processed_images = [self.preprocess_image(images[indices[n]], buffer_id=n) for n in weak]
+                plate_results = self.detection_model(processed_images, conf=self.detection_confidence)
+                for n, detections in zip(weak, plate_results):
+                    plates[n] = self._boxes_to_numpy(detections.boxes)[:2]
+
+            for (xyxy, conf), i in zip(plates, indices):
+                license_plates[i] = self._match_plates_to_vehicles(xyxy, conf, tracked[i])
+
             return license_plates
 
         except Exception as e:
             logger.error(f"Error detecting license plates: {e}")
+            return [[] for _ in images]
+
+    def _match_plates_to_vehicles(self, xyxy: np.ndarray, conf: np.ndarray, tracked_vehicles: np.ndarray) -> List[Dict[str, Any]]:
+        """Keep the plates lying inside a tracked vehicle, tagged with its track id"""
+        if len(xyxy) == 0 or len(tracked_vehicles) == 0:
             return []
+
+        if len(tracked_vehicles) == 1 and len(xyxy) < 8:
+            # common single-vehicle case: plain comparisons beat the kernel
+            # call and the fancy indexing below
+            car_x1, car_y1, car_x2, car_y2, id = tracked_vehicles[0].tolist()
+            vbbox = (int(car_x1), int(car_y1), int(car_x2), int(car_y2))
+            return [
+                {'id': int(id), 'bbox': tuple(bbox), 'vbbox': vbbox, 'confidence': confidence}
+                for bbox, confidence in zip(xyxy.tolist(), conf.tolist())
+                if bbox[0] > car_x1 and bbox[1] > car_y1 and bbox[2] < car_x2 and bbox[3] < car_y2
+            ]
+
+        owner = _owning_vehicles(xyxy, tracked_vehicles)
+        matched = owner >= 0
+
+        # cast in bulk, tolist() hands back plain Python ints and floats
+        vehicles = tracked_vehicles[owner[matched]].astype(np.int64)
+        ids = vehicles[:, 4].tolist()
+        vbboxes = vehicles[:, :4].tolist()
+        bboxes = xyxy[matched].tolist()
+        confidences = conf[matched].tolist()
+
+        return [
+            {'id': id, 'bbox': tuple(bbox), 'vbbox': tuple(vbbox), 'confidence': confidence}
+            for id, bbox, vbbox, confidence in zip(ids, bboxes, vbboxes, confidences)
+        ]
     
+    def _boxes_to_numpy(self, boxes) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Copy YOLO boxes to host in bulk instead of one transfer per box.
+        
+        Returns:
+            Tuple: int32 xyxy (N, 4), confidences (N,) and class ids (N,)
+        """
+        xyxy = boxes.xyxy.int().cpu().numpy()
+        conf = boxes.conf.cpu().numpy()
+        class_ids = boxes.cls.int().cpu().numpy()
+        return xyxy, conf, class_ids
+
     def extract_plate_roi(self, image: np.ndarray, bbox: Tuple[int, int, int, int]) -> np.ndarray:
         """
         Extract Region of Interest (ROI) for license plate.
@@ -187,31 +333,48 @@ class LicensePlateProcessor:
         Returns:
             np.ndarray: Cropped plate image
         """
-        try:
-            x1, y1, x2, y2 = bbox
+        return self.extract_plate_rois(image, [bbox])[0]
+
+    def extract_plate_rois(self, image: np.ndarray, bboxes: List[Tuple[int, int, int, int]]) -> List[np.ndarray]:
+        """
+        Extract every plate ROI of a frame, resized to a 64px height.
+        Boxes are clipped to the image in one NumPy pass instead of per plate.
+        
+        Args:
+            image: Input image
+            bboxes: Bounding boxes (x1, y1, x2, y2)
             
+        Returns:
+            List[np.ndarray]: Cropped plate images, in bboxes order
+        """
+        if not bboxes:
+            return []
+
+        try:
             # Ensure coordinates are within image bounds
             h, w = image.shape[:2]
-            x1 = max(0, x1)
-            y1 = max(0, y1)
-            x2 = min(w, x2)
-            y2 = min(h, y2)
-            
-            # Extract ROI
-            roi = image[y1:y2, x1:x2]
-            
+            boxes = np.array(bboxes, dtype=np.int64).reshape(-1, 4)
+            boxes[:, 0::2] = boxes[:, 0::2].clip(0, w)
+            boxes[:, 1::2] = boxes[:, 1::2].clip(0, h)
+
             # Resize ROI for better OCR (maintain aspect ratio)
             target_height = 64
-            aspect_ratio = roi.shape[1] / roi.shape[0]
-            target_width = int(target_height * aspect_ratio)
-            
-            roi_resized = cv2.resize(roi, (target_width, target_height))
-            
-            return roi_resized
+            heights = boxes[:, 3] - boxes[:, 1]
+            target_widths = target_height * (boxes[:, 2] - boxes[:, 0]) // np.maximum(heights, 1)
+
+            rois = []
+            for (x1, y1, x2, y2), height, target_width in zip(boxes.tolist(), heights.tolist(), target_widths.tolist()):
+                if height <= 0 or target_width <= 0:
+                    logger.error(f"Error extracting plate ROI: empty box {(x1, y1, x2, y2)}")
+                    rois.append(image)
+                    continue
+                rois.append(cv2.resize(image[y1:y2, x1:x2], (target_width, target_height)))
+
+            return rois
             
         except Exception as e:
             logger.error(f"Error extracting plate ROI: {e}")
-            return image
+            return [image] * len(bboxes)
     
     def enhance_plate_image(self, plate_image: np.ndarray) -> np.ndarray:
         """
@@ -237,26 +400,24 @@ class LicensePlateProcessor:
             lines = cv2.HoughLinesP(edges, 1, np.pi / 180, threshold=40,
                                     minLineLength=30, maxLineGap=100)
 
+            angles = np.empty(0)
             if lines is not None and len(lines) > 0:
-                angles = []
-                for line in lines:
-                    x1, y1, x2, y2 = line[0]
-                    angle_rad = np.arctan2(y2 - y1, x2 - x1)
-                    angle_deg = np.degrees(angle_rad)
-                    if -80 < angle_deg < 80:
-                        angles.append(angle_deg)
+                segments = lines[:, 0]
+                angles = np.degrees(np.arctan2(segments[:, 3] - segments[:, 1],
+                                               segments[:, 2] - segments[:, 0]))
+                angles = angles[(angles > -80) & (angles < 80)]
 
+            if angles.size > 0:
                 (h, w) = plate_image.shape[:2]
                 center = (w // 2, h // 2)
                 # angle = float(angles[0])
-                angle = float(np.mean(angles))
+                angle = float(angles.mean())
 
                 rotation_matrix = cv2.getRotationMatrix2D(center, angle, 1.0)
                 plate_image = cv2.warpAffine(plate_image, rotation_matrix, (w, h), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
 
             # Morphological operations to clean up the image
-            kernel = np.ones((2, 2), np.uint8)
-            cleaned = cv2.morphologyEx(plate_image, cv2.MORPH_CLOSE, kernel)
+            cleaned = cv2.morphologyEx(plate_image, cv2.MORPH_CLOSE, _CLOSE_KERNEL)
 
             return cleaned
 
@@ -265,8 +426,7 @@ class LicensePlateProcessor:
             return plate_image
 
     def _validate_plate_text(self, text: str) -> bool:
-        pattern = re.compile(r'^\d{10,11}$')
-        return bool(pattern.match(text))
+        return _PLATE_RE.match(text) is not None
     
     def recognize_plate_text(self, plate_image: np.ndarray, track_id: int) -> Dict[str, Any]:
         """
@@ -278,42 +438,63 @@ class LicensePlateProcessor:
         Returns:
             Dict: OCR results with text and confidence
         """
-        try:
-            # Enhance the plate image
-            enhanced_image = self.enhance_plate_image(plate_image)
-            
-            paddleocr_results = self.ocr_reader.predict(enhanced_image, batch_size=1)
-
-            if len(paddleocr_results) > 0:
-                text = paddleocr_results[0].get('rec_text') or ""
-                confidence = paddleocr_results[0].get('rec_score') or 0
+        return self.recognize_plate_texts([plate_image])[0]
 
-                cleaned_text = self._clean_plate_text(text)
+    def recognize_plate_texts(self, plate_images: List[np.ndarray]) -> List[Dict[str, Any]]:
+        """
+        Recognize text of several plate crops with a single OCR call.
+        
+        Args:
+            plate_images: Cropped plate images, e.g. every plate of a batch of frames
+            
+        Returns:
+            List[Dict]: OCR results in the same order, as in recognize_plate_text
+        """
+        if not plate_images:
+            return []
 
-                if confidence >= self.ocr_confidence_threshold and self._validate_plate_text(cleaned_text):
-                    return {
-                        'text': cleaned_text,
-                        'confidence': confidence,
-                        'method': 'paddleocr',
-                        'raw_text': text
-                    }
+        try:
+            # Enhance the plate images
+            enhanced_images = [self.enhance_plate_image(plate_image) for plate_image in plate_images]
+            
+            paddleocr_results = self.ocr_reader.predict(
+                enhanced_images,
+                batch_size=min(len(enhanced_images), settings.OCR_BATCH_SIZE),
+            )
 
-            return {
-                'text': '',
-                'confidence': 0.0,
-                'method': 'none',
-                'raw_text': ''
-            }
+            return [self._parse_ocr_result(result) for result in paddleocr_results]
             
         except Exception as e:
             logger.error(f"Error recognizing plate text: {e}")
-            return {
+            return [{
                 'text': '',
                 'confidence': 0.0,
                 'method': 'error',
                 'raw_text': '',
                 'error': str(e)
+            } for _ in plate_images]
+
+    def _parse_ocr_result(self, result) -> Dict[str, Any]:
+        """Turn one PaddleOCR recognition result into the plate OCR dict"""
+        text = result.get('rec_text') or ""
+        confidence = result.get('rec_score') or 0
+
+        cleaned_text = self._clean_plate_text(text)
+
+        if confidence >= self.ocr_confidence_threshold and self._validate_plate_text(cleaned_text):
+            return {
+                'text': cleaned_text,
+                'confidence': confidence,
+                'method': 'paddleocr',
+                'raw_text': text
             }
+
+        return {
+            'text': '',
+            'confidence': 0.0,
+            'method': 'none',
+            'raw_text': ''
+        }
     
     def _clean_plate_text(self, text: str) -> str:
         """
@@ -326,30 +507,8 @@ class LicensePlateProcessor:
             str: Cleaned and normalized text
         """
         try:
-            # Remove extra whitespace and convert to uppercase
-            cleaned = text.strip().upper()
-            
-            # Common character corrections for Algerian plates
-            corrections = {
-                'O': '0',  # Letter O to number 0
-                'I': '1',  # Letter I to number 1
-                'S': '5',  # Letter S to number 5
-                'B': '8',  # Letter B to number 8
-                'G': '6',
-                '|': '1',
-                ']': '1',
-                'J': '3',
-                'A': '4'
-            }
-            
-            # Apply corrections
-            for old, new in corrections.items():
-                cleaned = cleaned.replace(old, new)
-
-            cleaned = ''.join(c for c in cleaned if c.isalnum())
-            # cleaned = ' '.join(cleaned.split())
-            
-            return cleaned
+            # Uppercase, apply corrections and keep alphanumerics, all in C
+            return ''.join(filter(str.isalnum, text.upper().translate(_PLATE_CORRECTIONS)))
             
         except Exception as e:
             logger.error(f"Error cleaning plate text: {e}")
@@ -364,7 +523,7 @@ class LicensePlateProcessor:
             detection_id: Unique detection identifier
             
         Returns:
-            str: Path to saved thumbnail
+            str: Path the thumbnail will be written to
         """
         try:
             # Create thumbnails directory
@@ -376,18 +535,28 @@ class LicensePlateProcessor:
             filename = f"plate_{detection_id}_{timestamp}.jpg"
             filepath = os.path.join(thumbnails_dir, filename)
             
-            # Save image
-            cv2.imwrite(filepath, plate_image)
+            # Save image in the background, the crop is copied since the
+            # caller may reuse its buffer before the write happens
+            self._thumb_executor.submit(
+                cv2.imwrite, filepath, plate_image.copy(),
+                [cv2.IMWRITE_JPEG_QUALITY, settings.THUMBNAIL_JPEG_QUALITY, cv2.IMWRITE_JPEG_OPTIMIZE, 1],
+            )
             
-            logger.info(f"Saved plate thumbnail: {filepath}")
+            logger.info(f"Queued plate thumbnail: {filepath}")
             return filepath
             
         except Exception as e:
             logger.error(f"Error saving plate thumbnail: {e}")
             return ""
 
-    def annotate_frame(self, frame: np.ndarray, detections) -> np.ndarray:
-        annotated_frame = frame.copy()
+    def annotate_frame(self, frame: np.ndarray, detections, inplace: bool = False) -> np.ndarray:
+        # nothing to draw, hand the frame back untouched instead of copying it
+        if not detections:
+            return frame
+
+        # drawing on the caller's buffer saves a full-frame copy when the
+        # original pixels are not needed afterwards
+        annotated_frame = frame if inplace else frame.copy()
 
         for detection in detections:
             id = detection['id']
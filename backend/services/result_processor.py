@@ -1,10 +1,11 @@
 import asyncio
-from typing import Dict
+import time
+from typing import Dict, Optional, Tuple
 from backend.services.worker_pool import worker_pool
 from backend.database import AsyncSessionLocal
 from backend.schemas.plate import PlateStatus
 from backend.models import LicensePlate, LicensePlateDetection
-from collections import OrderedDict
+from collections import OrderedDict, defaultdict
 from backend.core.config import settings
 import logging
 from sqlalchemy import select
@@ -15,71 +16,99 @@ logger.setLevel(logging.INFO)
 class ResultProcessor:
     def __init__(self):
         self._frames: Dict[int, bytes] = {}
+        # set and replaced on every new frame, wakes all viewers of a camera
+        self._frame_events: Dict[int, asyncio.Event] = defaultdict(asyncio.Event)
         self._task = None
+        self._gc_task = None
+        self._results: asyncio.Queue = None
         self.history = OrderedDict()
+        # plate text -> ((id, status) or None, fetched at)
+        self._plate_cache: OrderedDict[str, Tuple[Optional[tuple], float]] = OrderedDict()
 
     async def start(self):
+        self._results = asyncio.Queue()
+        worker_pool.forward_results(asyncio.get_running_loop(), self._results)
         self._task = asyncio.create_task(self.result_handler())
+        self._gc_task = asyncio.create_task(self._history_gc())
 
-    async def result_handler(self):
+    async def _history_gc(self):
         while True:
-            result = worker_pool.get_result()
-            if not result:
-                # use the free time to clean history
-                while len(self.history) > settings.HISTORY_SIZE_THRESHOLD:
-                    self.history.popitem(last=False)
+            while len(self.history) > settings.HISTORY_SIZE_THRESHOLD:
+                self.history.popitem(last=False)
+            await asyncio.sleep(1.0)
 
-                await asyncio.sleep(0.01)
-                continue
+    async def result_handler(self):
+        while True:
+            result = await self._results.get()
 
             camera_id = result['camera_id']
-            self._frames[camera_id] = result['annotated_frame']
-            
+            # empty while nobody watches, workers skip encoding then; frames
+            # encoded just before the last viewer left are not kept either
+            if result['annotated_frame'] and worker_pool.stream_consumers.value:
+                self._frames[camera_id] = result['annotated_frame']
+                self._frame_events.pop(camera_id, asyncio.Event()).set()
+
+            # readings that need the database: new tracks or a changed text.
+            # Plates inside one vehicle share its track id, only the most
+            # confident of them is kept so a track never gets two rows
+            pending = {}
             for detection in result['detections']:
                 plate_text = detection["ocr"]["text"]
                 detection_id = detection["id"]
-                confidence = detection["overall_confidence"]
 
                 if not plate_text:
                     continue
 
-                prev =  self.history.get(detection_id)
+                prev = self.history.get(detection_id)
+                if prev and prev[0] == plate_text:
+                    self.history.move_to_end(detection_id)
+                    continue
+
+                kept = pending.get(detection_id)
+                if kept is None or detection["overall_confidence"] > kept[0]["overall_confidence"]:
+                    pending[detection_id] = (detection, prev)
+
+            if not pending:
+                continue
+            pending = list(pending.values())
+
+            async with AsyncSessionLocal() as db:
+                try:
+                    texts = {detection["ocr"]["text"] for detection, _ in pending}
+                    plates = await self._lookup_plates(db, texts)
+
+                    prev_ids = [prev[2] for _, prev in pending if prev]
+                    plate_detections = {}
+                    if prev_ids:
+                        db_result = await db.execute(
+                            select(LicensePlateDetection).where(LicensePlateDetection.id.in_(prev_ids))
+                        )
+                        plate_detections = {row.id: row for row in db_result.scalars()}
 
-                async with AsyncSessionLocal() as db:
-                    try:
-                        if prev and prev[0] != plate_text:
-                            db_result = await db.execute(
-                                select(LicensePlateDetection).where(LicensePlateDetection.id == prev[2])
-                            )
-                            plate_detection = db_result.scalar_one_or_none()
+                    new_detections = []
+                    for detection, prev in pending:
+                        plate_text = detection["ocr"]["text"]
+                        detection_id = detection["id"]
+                        confidence = detection["overall_confidence"]
+                        plate = plates.get(plate_text)
+
+                        if prev:
+                            plate_detection = plate_detections.get(prev[2])
+                            if plate_detection is None:
+                                continue
 
-                            db_result = await db.execute(
-                                select(LicensePlate).where(LicensePlate.plate_text.ilike(f"%{plate_text}%"))
-                            )
-                            plate = db_result.scalar_one_or_none()
                             if plate:
-                                plate_detection.status = PlateStatus.from_flags(plate.is_authorized, plate.is_blacklisted)
+                                plate_detection.status = plate[1]
 
                             plate_detection.detected_plate_text = plate_text
                             plate_detection.overall_confidence = confidence
 
                             prev[0] = plate_text
                             prev[1] = confidence
-
-                            await db.commit()
                             self.history.move_to_end(detection_id)
                             continue
 
-                        if prev:
-                            self.history.move_to_end(detection_id)
-                            continue
-
-                        db_result = await db.execute(
-                            select(LicensePlate).where(LicensePlate.plate_text.ilike(f"%{plate_text}%"))
-                        )
-                        plate = db_result.scalar_one_or_none()
-                        plate_id = plate.id if plate else None
-                        status = PlateStatus.from_flags(plate.is_authorized, plate.is_blacklisted) if plate else PlateStatus.UNKNOWN
+                        plate_id, status = plate if plate else (None, PlateStatus.UNKNOWN)
 
                         new_detection = LicensePlateDetection(
                             detected_plate_text=plate_text,
@@ -93,30 +122,87 @@ class ResultProcessor:
                         )
 
                         db.add(new_detection)
-                        await db.commit()
-                        await db.refresh(new_detection)
+                        new_detections.append((detection_id, plate_text, confidence, new_detection))
 
+                    await db.commit()
+
+                    # primary keys are filled in by the flush, no refresh needed
+                    for detection_id, plate_text, confidence, new_detection in new_detections:
                         self.history[detection_id] = [plate_text, confidence, new_detection.id]
                         self.history.move_to_end(detection_id)
-                    except Exception as e:
-                        logger.error(f"Error handling results: {e}")
-
+                except Exception as e:
+                    logger.error(f"Error handling results: {e}")
+
+
+    async def _lookup_plates(self, db, texts) -> Dict[str, Optional[tuple]]:
+        """
+        Resolve plate texts to (id, status), None for unregistered plates.
+        The status is derived once per lookup, not per detection. Recent
+        answers, negative ones included, come from an LRU cache; the rest
+        is fetched with a single query.
+        """
+        now = time.monotonic()
+        plates = {}
+        missing = set()
+        for text in texts:
+            hit = self._plate_cache.get(text)
+            if hit and now - hit[1] < settings.PLATE_CACHE_TTL:
+                self._plate_cache.move_to_end(text)
+                plates[text] = hit[0]
+            else:
+                missing.add(text)
+
+        if missing:
+            db_result = await db.execute(
+                select(LicensePlate).where(LicensePlate.plate_text.in_(missing))
+            )
+            found = {
+                plate.plate_text: (plate.id, PlateStatus.from_flags(plate.is_authorized, plate.is_blacklisted))
+                for plate in db_result.scalars()
+            }
+            for text in missing:
+                plates[text] = found.get(text)
+                self._plate_cache[text] = (plates[text], now)
+                self._plate_cache.move_to_end(text)
+
+            while len(self._plate_cache) > settings.PLATE_CACHE_SIZE:
+                self._plate_cache.popitem(last=False)
+
+        return plates
+
+    def invalidate_plates(self):
+        """Drop cached plate lookups, called after plates are created, edited or deleted"""
+        self._plate_cache.clear()
 
     async def gen_frames(self, camera_id):
+        consumers = worker_pool.stream_consumers
+        with consumers.get_lock():
+            consumers.value += 1
         try:
             while True:
+                # take the event before yielding so a frame arriving while
+                # the client is being written to is not missed
+                new_frame = self._frame_events[camera_id]
                 frame = self._frames.get(camera_id)
                 if frame is not None:
                     yield (b'--frame\r\n'
                            b'Content-Type: image/jpeg\r\n\r\n' + frame + b'\r\n')
-                # TODO make this dynamic
-                await asyncio.sleep(0.1) # for ~10 fps
+                await new_frame.wait()
         except:
             pass
+        finally:
+            with consumers.get_lock():
+                consumers.value -= 1
+                if consumers.value == 0:
+                    # workers stop encoding now, so what's stored here would
+                    # be shown as the first frame to the next viewer
+                    self._frames.clear()
 
     async def shutdown(self):
         if self._task:
             self._task.cancel()
+        if self._gc_task:
+            self._gc_task.cancel()
 
 
 result_processor = ResultProcessor()
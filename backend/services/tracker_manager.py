@@ -1,13 +1,69 @@
 from backend.services.sort.sort import Sort
-from typing import Dict
-from collections import OrderedDict
+from backend.core.config import settings
+from typing import Any, Dict, Tuple
+import numpy as np
+
+
+class PlateHistory:
+    """
+    Best OCR reading seen for each track id of a camera, bounded to `size`
+    tracks.
+
+    Confidences live in a fixed NumPy struct array and readings in a list of
+    the same length, with a dict mapping track ids to slots. When full, a
+    CLOCK sweep evicts a track that has not been seen since the last pass,
+    which approximates LRU without relinking anything per update.
+    """
+
+    def __init__(self, size: int):
+        self._slots = np.zeros(size, dtype=[('id', 'i8'), ('conf', 'f8'), ('used', '?')])
+        self._ids = self._slots['id']
+        self._conf = self._slots['conf']
+        self._used = self._slots['used']
+        self._readings = [None] * size
+        self._id2slot: Dict[int, int] = {}
+        self._hand = 0
+
+    def __len__(self):
+        return len(self._id2slot)
+
+    def update(self, track_id: int, reading: Any, confidence: float) -> Tuple[Any, float]:
+        """Record a reading for a track and return the most confident one so far"""
+        slot = self._id2slot.get(track_id)
+        if slot is None:
+            slot = self._free_slot()
+            self._id2slot[track_id] = slot
+            self._ids[slot] = track_id
+            self._conf[slot] = confidence
+            self._readings[slot] = reading
+        elif self._conf[slot] <= confidence:
+            self._conf[slot] = confidence
+            self._readings[slot] = reading
+        else:
+            reading = self._readings[slot]
+            confidence = float(self._conf[slot])
+
+        self._used[slot] = True
+        return reading, confidence
+
+    def _free_slot(self) -> int:
+        while True:
+            slot = self._hand
+            self._hand = (slot + 1) % len(self._readings)
+            if self._used[slot]:
+                self._used[slot] = False  # second chance
+                continue
+            if self._readings[slot] is not None:
+                del self._id2slot[int(self._ids[slot])]
+                self._readings[slot] = None
+            return slot
 
 
 # WARNING: this is no more thread safe!
 class CameraTrackerManager:
     def __init__(self):
         self._trackers: Dict[int, Sort] = {}
-        self._history: OrderedDict[int, Dict[int, List[str, int]]] = {}
+        self._history: Dict[int, PlateHistory] = {}
     
     def get_tracker(self, camera_id: int) -> Sort:
         """Get or create tracker for camera"""
@@ -15,7 +71,7 @@ class CameraTrackerManager:
             self._trackers[camera_id] = Sort()
         return self._trackers[camera_id]
     
-    def get_history(self, camera_id: int):
+    def get_history(self, camera_id: int) -> PlateHistory:
         if camera_id not in self._history:
-            self._history[camera_id] = OrderedDict()
+            self._history[camera_id] = PlateHistory(settings.HISTORY_SIZE_THRESHOLD)
         return self._history[camera_id]
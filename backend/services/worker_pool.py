@@ -1,71 +1,265 @@
 import multiprocessing as mp
-from multiprocessing import Process, Queue
+from multiprocessing import Process
+from faster_fifo import Queue
+import faster_fifo_reduction  # noqa: F401 - lets the queues pickle into spawned workers
 import logging
-from queue import Empty
-import numpy as np
-import torch
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import weakref
+from collections import defaultdict
+from queue import Empty, Full
+from typing import Dict, List, Optional
 import cv2
+import torch
 from datetime import datetime
 from backend.core.config import settings
-
-# TODO: switch to "faster-fifo"
+from backend.services.frame_ring import FrameRing
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
-def model_worker(
-    worker_id: int,
-    input_queue: Queue,
+
+def _collect_batch(input_queue: Queue) -> list:
+    """
+    Block for one task, then keep collecting for up to BATCH_WAIT_MS so the
+    models see up to INFERENCE_BATCH_SIZE frames per call, frames from
+    other cameras included.
+    """
+    tasks = input_queue.get_many(timeout=1, max_messages_to_get=settings.INFERENCE_BATCH_SIZE)
+
+    deadline = time.monotonic() + settings.BATCH_WAIT_MS / 1000
+    while len(tasks) < settings.INFERENCE_BATCH_SIZE:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            tasks += input_queue.get_many(
+                timeout=remaining,
+                max_messages_to_get=settings.INFERENCE_BATCH_SIZE - len(tasks),
+            )
+        except Empty:
+            break
+
+    return [task for task in tasks if task is not None]
+
+
+class _AttachedRings:
+    """
+    Frame rings a worker has attached, keyed by shared memory name and
+    reference counted per resolved frame.
+
+    Closing a ring unmaps its segment under any numpy view still pointing
+    into it, so a ring is only closed once its camera has moved on to a
+    newer ring, or sent nothing for IDLE_SECONDS (stopped or deleted), and
+    no batch (detected or still in the finisher) holds one of its frames.
+    Used from both worker threads, hence the lock.
+    """
+
+    IDLE_SECONDS = 10.0
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rings: Dict[str, list] = {}  # name -> [ring, frames held]
+        self._current: Dict[int, str] = {}  # camera id -> newest ring name
+        self._last_task: Dict[int, float] = {}  # camera id -> monotonic time
+
+    def resolve(self, task: dict):
+        """
+        Map a task to its ring and frame in shared memory, None when it went
+        stale. The frame stays valid until release() is called for it.
+        Raises FileNotFoundError when the producer already removed the ring.
+        """
+        name = task['ring'][0]
+        camera_id = task['camera_id']
+        slot = task['slot']
+
+        with self._lock:
+            self._last_task[camera_id] = time.monotonic()
+            entry = self._rings.get(name)
+            if entry is None:
+                entry = self._rings[name] = [FrameRing.attach(task['ring']), 0]
+
+            # a restarted camera comes back with a new segment, tasks of one
+            # camera arrive in order so the previous ring is done for
+            previous = self._current.get(camera_id)
+            if previous != name:
+                self._current[camera_id] = name
+                if previous is not None:
+                    self._close_if_idle(previous)
+
+            ring = entry[0]
+            if not ring.is_current(slot, task['seq']):
+                return None  # reference outlived the slot's ring
+            entry[1] += 1
+            return ring, ring.frames[slot]
+
+    def release(self, ring: FrameRing, slot: int):
+        """Hand the slot back to the producer and drop this frame's hold"""
+        with self._lock:
+            ring.release(slot)
+            self._rings[ring.name][1] -= 1
+            self._close_if_idle(ring.name)
+
+    def retire_idle(self):
+        """
+        Forget the ring of every camera that sent no task for IDLE_SECONDS,
+        so a stopped camera's unlinked segment is unmapped here too. A
+        camera that was only stalled attaches to its ring again.
+        """
+        now = time.monotonic()
+        with self._lock:
+            for camera_id, last in list(self._last_task.items()):
+                if now - last < self.IDLE_SECONDS:
+                    continue
+                del self._last_task[camera_id]
+                name = self._current.pop(camera_id, None)
+                if name is not None:
+                    self._close_if_idle(name)
+
+    def _close_if_idle(self, name: str):
+        entry = self._rings.get(name)
+        if entry is None or entry[1] > 0 or name in self._current.values():
+            return
+        del self._rings[name]
+        entry[0].close()
+
+
+# GPU encode path state, per worker process: a pinned staging buffer grown
+# to the largest batch seen, and a side stream so uploads and nvJPEG run
+# next to the detector instead of queueing behind it
+_pinned_staging = None
+_encode_stream = None
+
+
+def _stream_size(frame):
+    """(height, width) the stream is capped to, None when the frame already fits"""
+    height, width = frame.shape[:2]
+    if not settings.STREAM_MAX_WIDTH or width <= settings.STREAM_MAX_WIDTH:
+        return None
+    return round(height * settings.STREAM_MAX_WIDTH / width), settings.STREAM_MAX_WIDTH
+
+
+def _upload_pinned(frames: list) -> list:
+    """Copy frames through pinned host memory and start async uploads"""
+    global _pinned_staging
+
+    total = sum(frame.nbytes for frame in frames)
+    if _pinned_staging is None or _pinned_staging.numel() < total:
+        _pinned_staging = torch.empty(total, dtype=torch.uint8, pin_memory=True)
+
+    tensors, offset = [], 0
+    for frame in frames:
+        staged = _pinned_staging[offset:offset + frame.nbytes].view(frame.shape)
+        staged.copy_(torch.from_numpy(frame))
+        tensors.append(staged.to("cuda", non_blocking=True))
+        offset += frame.nbytes
+    return tensors
+
+
+def _encode_jpegs(frames: list, device: str) -> List[bytes]:
+    """
+    JPEG-encode annotated frames for the MJPEG stream, downscaled to at
+    most STREAM_MAX_WIDTH since viewers rarely need the full resolution.
+
+    On CUDA workers, frames of at least GPU_JPEG_MIN_PIXELS go through nvJPEG
+    in one batched call; smaller ones stay on libjpeg-turbo, where the upload
+    costs more than the encode saves.
+    """
+    # imported here so only the worker processes load them, not the API process
+    import simplejpeg
+
+    global _encode_stream
+    jpegs = [None] * len(frames)
+
+    if device == "cuda":
+        import torchvision
+
+        large = [i for i, frame in enumerate(frames)
+                 if frame.shape[0] * frame.shape[1] >= settings.GPU_JPEG_MIN_PIXELS]
+        if large:
+            if _encode_stream is None:
+                _encode_stream = torch.cuda.Stream()
+
+            with torch.inference_mode(), torch.cuda.stream(_encode_stream):
+                # BGR HWC -> RGB CHW on the device
+                tensors = [t.permute(2, 0, 1).flip(0) for t in _upload_pinned([frames[i] for i in large])]
+                for n, i in enumerate(large):
+                    size = _stream_size(frames[i])
+                    if size is not None:
+                        scaled = torch.nn.functional.interpolate(tensors[n][None].float(), size=size, mode='area')
+                        tensors[n] = scaled[0].round_().to(torch.uint8)
+                encoded = torchvision.io.encode_jpeg(tensors, quality=settings.STREAM_JPEG_QUALITY)
+                # .cpu() syncs the stream, the staging buffer is free again after this
+                for i, jpeg in zip(large, encoded):
+                    jpegs[i] = jpeg.cpu().numpy().tobytes()
+
+    for i, frame in enumerate(frames):
+        if jpegs[i] is None:
+            size = _stream_size(frame)
+            if size is not None:
+                # area averaging keeps thin box outlines and labels legible
+                frame = cv2.resize(frame, size[::-1], interpolation=cv2.INTER_AREA)
+            # libjpeg-turbo straight from BGR with the fast DCT and 4:2:0
+            # chroma, MJPEG viewers don't need more; releases the GIL
+            jpegs[i] = simplejpeg.encode_jpeg(
+                frame,
+                quality=settings.STREAM_JPEG_QUALITY,
+                colorspace='BGR',
+                colorsubsampling='420',
+                fastdct=True,
+            )
+
+    return jpegs
+
+
+def _finish_batch(
+    processor,
+    tracker_manager,
     output_queue: Queue,
+    worker_id: int,
+    batch: list,
+    attached: _AttachedRings,
+    rings: list,
+    frames: list,
+    batch_plates: list,
+    start_ns: int,
+    stream: bool,
 ):
-    """Worker process - loads model once and processes frames from any camera"""
-    
-    from backend.services.image_processing import LicensePlateProcessor
-    from backend.services.tracker_manager import CameraTrackerManager
-    
-    processor = LicensePlateProcessor()
-    tracker_manager = CameraTrackerManager()
-    
-    logger.info(f"Worker {worker_id} started on device: {processor.device}")
-    
-    while True:
-        try:
-            task = input_queue.get(timeout=1)
-            if task is None:
-                continue
-            
-            camera_id = task['camera_id']
-            frame = task['frame']
-            timestamp = task['timestamp']
-            
-            start_time = datetime.now()
+    """
+    OCR, history smoothing, annotation and output for one detected batch.
+    Frames are only annotated and encoded when someone watches a stream.
+    Hands the batch's ring slots back to the producers when done.
+    """
+    try:
+        # OCR every plate of the batch in one call
+        plate_rois = [
+            roi
+            for frame, license_plates in zip(frames, batch_plates)
+            for roi in processor.extract_plate_rois(frame, [plate['bbox'] for plate in license_plates])
+        ]
+        ocr_start_ns = time.perf_counter_ns()
+        ocr_results = iter(processor.recognize_plate_texts(plate_rois))
+        ocr_time_ms = (time.perf_counter_ns() - ocr_start_ns) / 1e6 / max(len(plate_rois), 1)
 
-            tracker = tracker_manager.get_tracker(camera_id)
+        outputs, annotated_frames = [], []
+        plate_count = 0
+        for task, frame, license_plates in zip(batch, frames, batch_plates):
+            camera_id = task['camera_id']
             history = tracker_manager.get_history(camera_id)
-            
-            license_plates = processor.detect_license_plates(frame, tracker)
-            
+
             detections = []
             for plate in license_plates:
-                plate_start_time = datetime.now()
+                plate_start_ns = time.perf_counter_ns()
                 
                 id = plate['id']
                 bbox = plate['bbox']
-                plate_roi = processor.extract_plate_roi(frame, bbox)
-                ocr_result = processor.recognize_plate_text(plate_roi, int(id))
+                ocr_result = next(ocr_results)
                 ocr_confidence = ocr_result['confidence']
 
-                prev_reading = history.get(id)
-                if not prev_reading or prev_reading[1] <= ocr_confidence:
-                    history[id] = (ocr_result, ocr_confidence)
-
-                    if len(history) > settings.HISTORY_SIZE_THRESHOLD:
-                        history.popitem(last=False)
-                else:
-                    ocr_result = prev_reading[0]
-                    ocr_confidence = prev_reading[1]
-
-                history.move_to_end(id)
+                # keep the most confident reading of this track
+                ocr_result, ocr_confidence = history.update(id, ocr_result, ocr_confidence)
 
                 detections.append({
                     'id': id,
@@ -73,30 +267,141 @@ def model_worker(
                     'bbox': bbox,
                     'ocr': ocr_result,
                     'overall_confidence': (plate['confidence'] + ocr_confidence) / 2,
-                    'processing_time_ms': (datetime.now() - plate_start_time).total_seconds() * 1000
+                    # share of the batched OCR call plus this plate's own bookkeeping
+                    'processing_time_ms': ocr_time_ms + (time.perf_counter_ns() - plate_start_ns) / 1e6
                 })
             
-            annotated_frame = processor.annotate_frame(frame, detections)
-            ret, jpeg = cv2.imencode('.jpg', annotated_frame)
-            if not ret:
-                annotated_frame = b''
-            annotated_frame = jpeg.tobytes()
+            if stream:
+                # the ring slot is ours until the next task, draw straight on it
+                annotated_frames.append(processor.annotate_frame(frame, detections, inplace=True))
 
-            output_queue.put({
+            outputs.append({
                 'camera_id': camera_id,
-                'annotated_frame': annotated_frame,
-                'timestamp': timestamp,
+                'annotated_frame': b'',
+                'timestamp': task['timestamp'],
                 'detections': detections,
                 'worker_id': worker_id
             })
+            plate_count += len(detections)
 
-            processing_time = (datetime.now() - start_time).total_seconds() * 1000
-            logger.info(f"Processed frame with {len(detections)} plates in {processing_time:.2f}ms")
-            
+        if stream:
+            for output, jpeg in zip(outputs, _encode_jpegs(annotated_frames, processor.device)):
+                output['annotated_frame'] = jpeg
+
+        # one lock round-trip for the whole batch
+        output_queue.put_many(outputs)
+
+        processing_time = (time.perf_counter_ns() - start_ns) / 1e6
+        logger.info(f"Processed {len(batch)} frames with {plate_count} plates in {processing_time:.2f}ms")
+
+    except Exception as e:
+        logger.error(f"Worker {worker_id} error: {e}", exc_info=True)
+    finally:
+        for task, ring in zip(batch, rings):
+            attached.release(ring, task['slot'])
+
+
+def _pin_worker(worker_id: int, num_workers: int) -> str:
+    """
+    Restrict a worker to its own contiguous share of the allowed cores, so
+    workers stop migrating onto each other's caches. A share rather than a
+    single core: detection, OCR and the finishing thread all run in it.
+    Returns a description for the startup log.
+    """
+    if not settings.PIN_WORKERS or not hasattr(os, "sched_setaffinity"):
+        return "unpinned"
+
+    cores = sorted(os.sched_getaffinity(0))
+    share = max(1, len(cores) // num_workers)
+    start = (worker_id * share) % len(cores)
+    mine = cores[start:start + share]
+    try:
+        os.sched_setaffinity(0, mine)
+    except OSError as e:
+        logger.warning(f"Worker {worker_id}: could not pin to cores {mine}: {e}")
+        return "unpinned"
+    return f"cores {mine[0]}-{mine[-1]}"
+
+
+def model_worker(
+    worker_id: int,
+    num_workers: int,
+    input_queue: Queue,
+    output_queue: Queue,
+    stream_consumers,
+):
+    """Worker process - loads model once and processes frames from any camera"""
+
+    # pin before the runtimes size their thread pools
+    pinned = _pin_worker(worker_id, num_workers)
+
+    # nothing here ever trains; grad mode is per thread, so the torch work
+    # below (and on the finishing thread) also runs under inference_mode
+    torch.set_grad_enabled(False)
+    
+    from backend.services.image_processing import LicensePlateProcessor
+    from backend.services.tracker_manager import CameraTrackerManager
+    
+    processor = LicensePlateProcessor()
+    tracker_manager = CameraTrackerManager()
+    attached = _AttachedRings()
+
+    # second stage of a two-deep pipeline: batch N goes through OCR and
+    # encoding on this thread while batch N+1 is in the detector. Both
+    # runtimes release the GIL during inference, so the GPU (or spare
+    # cores) stays busy across the model switch.
+    finisher = ThreadPoolExecutor(max_workers=1)
+    pending = None
+    
+    logger.info(f"Worker {worker_id} started on device: {processor.device} ({pinned})")
+    
+    while True:
+        attached.retire_idle()
+        try:
+            tasks = _collect_batch(input_queue)
         except Empty:
             continue
         except Exception as e:
             logger.error(f"Worker {worker_id} error: {e}", exc_info=True)
+            continue
+
+        frames, batch, batch_rings = [], [], []
+        try:
+            for task in tasks:
+                try:
+                    resolved = attached.resolve(task)
+                except FileNotFoundError:
+                    continue  # camera restarted and its old ring is gone
+                if resolved is not None:
+                    batch_rings.append(resolved[0])
+                    frames.append(resolved[1])
+                    batch.append(task)
+
+            if not batch:
+                continue
+            
+            start_ns = time.perf_counter_ns()
+
+            trackers = [tracker_manager.get_tracker(task['camera_id']) for task in batch]
+            with torch.inference_mode():
+                batch_plates = processor.detect_license_plates_batch(frames, trackers)
+
+            # one batch in flight at most, keeps results in order
+            if pending is not None:
+                pending.result()
+            # from here on the finisher owns the batch's slots
+            pending = finisher.submit(
+                _finish_batch, processor, tracker_manager, output_queue,
+                worker_id, batch, attached, batch_rings, frames, batch_plates, start_ns,
+                stream_consumers.value > 0,
+            )
+            batch, frames = [], []
+            
+        except Exception as e:
+            logger.error(f"Worker {worker_id} error: {e}", exc_info=True)
+        finally:
+            for task, ring in zip(batch, batch_rings):
+                attached.release(ring, task['slot'])
     
     logger.info(f"Worker {worker_id} shutting down")
 
@@ -106,45 +411,177 @@ class WorkerPool:
     
     def __init__(self, num_workers: int = 1):
         self.num_workers = num_workers
-        self.input_queues = [mp.Queue(maxsize=100) for _ in range(self.num_workers)]
-        self.output_queue = mp.Queue()
+        # inputs are only slot references (~100 of them), outputs carry JPEGs
+        self.input_queues = [Queue(max_size_bytes=32 * 1024) for _ in range(self.num_workers)]
+        # one output queue per worker: every queue has a single producer and
+        # a single forwarding thread, so posting results never contends
+        self.output_queues = [Queue(max_size_bytes=100 * 1024 * 1024) for _ in range(self.num_workers)]
         self.workers: List[Process] = []
+        self._forwarders: List[threading.Thread] = []
+        # rings by shared memory name, to free the slot of a dropped task
+        self._rings: "weakref.WeakValueDictionary[str, FrameRing]" = weakref.WeakValueDictionary()
+        self.dropped: Dict[int, int] = defaultdict(int)
+        # open MJPEG streams, workers skip annotation and encoding at zero
+        self.stream_consumers = mp.Value('i', 0)
     
     def start(self):
         """Start all worker processes"""
         for i in range(self.num_workers):
             worker = Process(
                 target=model_worker,
-                args=(i, self.input_queues[i], self.output_queue)
+                args=(i, self.num_workers, self.input_queues[i], self.output_queues[i],
+                      self.stream_consumers)
             )
             worker.daemon = True
             worker.start()
             self.workers.append(worker)
         logger.info(f"Started {self.num_workers} workers")
     
-    def submit_frame(self, camera_id: int, frame: np.ndarray, 
+    def pressure(self, camera_id: int) -> int:
+        """Number of frames waiting for the worker that serves this camera"""
+        return self.input_queues[camera_id % self.num_workers].qsize()
+
+    def acquire_slot(self, camera_id: int, ring: FrameRing) -> Optional[int]:
+        """
+        Take a free slot of `ring` for the camera's next frame. A live stream
+        wants the newest frame processed, not a stale one, so once the worker
+        is QUEUE_PRESSURE_THRESHOLD frames behind its oldest queued frame is
+        dropped, and when every slot is taken the camera's own oldest queued
+        frame gives its slot up. None means the worker holds all of them.
+        """
+        input_queue = self.input_queues[camera_id % self.num_workers]
+        if self.pressure(camera_id) >= settings.QUEUE_PRESSURE_THRESHOLD:
+            try:
+                self._drop(input_queue.get_nowait())
+            except Empty:
+                pass  # the worker drained it meanwhile
+
+        slot = ring.acquire()
+        if slot is None and self._drop_oldest(input_queue, ring.name):
+            slot = ring.acquire()
+        return slot
+
+    def _drop_oldest(self, input_queue: Queue, ring_name: str) -> bool:
+        """
+        Drop the oldest queued frame from the given ring, keeping the other
+        cameras' frames queued in order. Cameras are all captured from the
+        event loop, so nothing else puts to the queue meanwhile.
+        """
+        try:
+            tasks = input_queue.get_many(block=False)
+        except Empty:
+            return False
+
+        dropped = False
+        for i, task in enumerate(tasks):
+            if task['ring'][0] == ring_name:
+                self._drop(tasks.pop(i))
+                dropped = True
+                break
+
+        if tasks:
+            try:
+                input_queue.put_many(tasks, block=False)
+            except Full:
+                for task in tasks:
+                    self._drop(task)
+        return dropped
+
+    def submit_frame(self, camera_id: int, ring: FrameRing, slot: int,
                      timestamp: datetime):
-        """Submit frame for processing (non-blocking)"""
+        """
+        Submit frame for processing (non-blocking).
+        Only the ring slot reference is queued, workers read the pixels
+        straight from shared memory.
+
+        Producers are expected to take the slot through acquire_slot(),
+        which keeps the queue short by dropping its oldest frames. Should
+        the queue be full anyway, the oldest frame is dropped here as well.
+        A False return means even that failed and this frame was dropped.
+        """
         worker_id = camera_id % self.num_workers # just to avoid sharing the tracker
+        input_queue = self.input_queues[worker_id]
+        self._rings[ring.name] = ring
+        task = {
+            'camera_id': camera_id,
+            'ring': ring.spec(),
+            'slot': slot,
+            'seq': int(ring.seq[slot]),
+            'timestamp': timestamp,
+        }
+
         try:
-            self.input_queues[worker_id].put_nowait({
-                'camera_id': camera_id,
-                'frame': frame,
-                'timestamp': timestamp,
-            })
+            input_queue.put_nowait(task)
             return True
-        except:
-            return False  # Queue full, skip frame
-    
-    def get_result(self, timeout: float = 0.01):
-        """Get processing result (non-blocking)"""
+        except Full:
+            pass
+
+        try:
+            self._drop(input_queue.get_nowait())
+        except Empty:
+            pass  # the worker drained it meanwhile
+
         try:
-            return self.output_queue.get(timeout=timeout)
-        except:
-            return None
+            input_queue.put_nowait(task)
+            return True
+        except Full:
+            return False  # Queue still full, skip frame
+
+    def _drop(self, task: dict):
+        """Give a dropped task's slot back to its ring and count it"""
+        if task is None:
+            return
+        ring = self._rings.get(task['ring'][0])
+        if ring is not None:
+            ring.release(task['slot'])
+
+        camera_id = task['camera_id']
+        self.dropped[camera_id] += 1
+        if self.dropped[camera_id] % 100 == 1:
+            logger.warning(f"Camera {camera_id}: dropped {self.dropped[camera_id]} stale frames so far")
+    
+    def forward_results(self, loop, results):
+        """
+        Move worker results into an asyncio.Queue from background threads,
+        one per worker output queue, so the consumer awaits them instead of
+        polling.
+        """
+        def put_all(batch):
+            for result in batch:
+                results.put_nowait(result)
+
+        def forward(output_queue):
+            while True:
+                try:
+                    batch = output_queue.get_many(timeout=1)
+                except Empty:
+                    continue
+
+                stop = None in batch
+                if stop:
+                    batch = batch[:batch.index(None)]
+                try:
+                    # one loop wakeup per batch of results
+                    loop.call_soon_threadsafe(put_all, batch)
+                except RuntimeError:
+                    break  # event loop already closed
+                if stop:
+                    break
+
+        for i, output_queue in enumerate(self.output_queues):
+            forwarder = threading.Thread(target=forward, args=(output_queue,),
+                                         name=f"result-forwarder-{i}", daemon=True)
+            forwarder.start()
+            self._forwarders.append(forwarder)
     
     def shutdown(self):
         """Gracefully shutdown workers"""
+        if self._forwarders:
+            for output_queue in self.output_queues:
+                output_queue.put(None)
+            for forwarder in self._forwarders:
+                forwarder.join(timeout=5)
+
         for worker in self.workers:
             worker.join(timeout=5)
             if worker.is_alive():
@@ -152,7 +589,7 @@ class WorkerPool:
 
         for i in range(self.num_workers):
             self.input_queues[i].close()
-        self.output_queue.close()
+            self.output_queues[i].close()
         
         logger.info("Worker pool shutdown complete")
 